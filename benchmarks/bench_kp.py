@@ -0,0 +1,124 @@
+"""
+Benchmark the Kolm-Pollak EDE against the distribution size N.
+
+For each N, times `kolmpollak.ede` on a new Distribution, forced through the
+NumPy path, the single-threaded numba kernels and the multi-threaded numba
+kernels in turn, and reports the throughput in GB/s of input data. Use it to
+re-check `SMALL_THRESHOLD` and `PARALLEL_THRESHOLD` in
+`inequalipy/_kernels.py` on a given machine: the single-threaded kernels
+should win up to SMALL_THRESHOLD, and the multi-threaded kernels above
+PARALLEL_THRESHOLD.
+
+Usage
+-----
+    python benchmarks/bench_kp.py [--weighted] [--float32] [--max-size N]
+
+inequalipy must be importable: install it with `pip install -e .`, or run
+from the repository root with `PYTHONPATH=.` set. Set NUMBA_NUM_THREADS to
+benchmark with a given number of threads; with a single thread the
+multi-threaded kernels are not used, and their column shows "-".
+"""
+import argparse
+import time
+from contextlib import contextmanager
+import numpy as np
+from inequalipy import kolmpollak, Distribution, _kernels
+
+HAVE_NUMBA = _kernels.HAVE_NUMBA
+
+
+def best_time(f, min_time = 0.2):
+    """
+    Return the best time per call of `f` in seconds, over repeated loops
+    that each take at least `min_time` / 5 seconds.
+    """
+    f()
+    number = 1
+    while True:
+        start = time.perf_counter()
+        for _ in range(number):
+            f()
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_time / 5:
+            break
+        number *= 2
+    best = elapsed
+    for _ in range(4):
+        start = time.perf_counter()
+        for _ in range(number):
+            f()
+        best = min(best, time.perf_counter() - start)
+    return best / number
+
+
+@contextmanager
+def forced_path(have_numba, small_threshold, parallel_threshold):
+    """
+    Temporarily override the dispatch thresholds in `_kernels`.
+    """
+    saved = (_kernels.HAVE_NUMBA, _kernels.SMALL_THRESHOLD, _kernels.PARALLEL_THRESHOLD)
+    _kernels.HAVE_NUMBA = have_numba
+    _kernels.SMALL_THRESHOLD = small_threshold
+    _kernels.PARALLEL_THRESHOLD = parallel_threshold
+    try:
+        yield
+    finally:
+        _kernels.HAVE_NUMBA, _kernels.SMALL_THRESHOLD, _kernels.PARALLEL_THRESHOLD = saved
+
+
+def numba_threads():
+    """
+    The number of threads numba runs parallel kernels on.
+    """
+    import numba
+    return numba.get_num_threads()
+
+
+def run(sizes, epsilon, weighted, dtype):
+    rng = np.random.default_rng(0)
+    print("%10s %14s %14s %14s   %s" % ("N", "numpy", "serial", "parallel", "GB/s (us per call)"))
+    for n in sizes:
+        a = rng.lognormal(3, 1, n)
+        weights = rng.integers(1, 10, n) if weighted else None
+        nbytes = n * np.dtype(dtype).itemsize * (1 if weights is None else 2)
+
+        # A new Distribution per call, so nothing is cached between calls
+        def ede():
+            return kolmpollak.ede(Distribution(a, weights, dtype), epsilon)
+
+        paths = [(False, 0, 0)]
+        if HAVE_NUMBA:
+            paths.append((True, n, n))
+            if numba_threads() > 1:
+                paths.append((True, 0, 0))
+        timings = []
+        for have_numba, small, parallel in paths:
+            with forced_path(have_numba, small, parallel):
+                timings.append(best_time(ede))
+
+        cells = ["%6.2f (%5.0f)" % (nbytes / t / 1e9, t * 1e6) for t in timings]
+        cells += ["%14s" % "-"] * (3 - len(cells))
+        best = ("numpy", "serial", "parallel")[int(np.argmin(timings))]
+        print("%10d %s   fastest: %s" % (n, " ".join(cells), best))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[1])
+    parser.add_argument("--weighted", action="store_true", help="benchmark weighted distributions")
+    parser.add_argument("--float32", action="store_true", help="store the values in float32")
+    parser.add_argument("--epsilon", type=float, default=0.5, help="inequality aversion parameter")
+    parser.add_argument("--max-size", type=int, default=10 ** 7, help="largest N to benchmark")
+    args = parser.parse_args()
+
+    sizes = [n for n in np.unique(np.logspace(1, 8, 29).astype(int)) if n <= args.max_size]
+    if HAVE_NUMBA:
+        print("numba threads: %d" % numba_threads())
+    else:
+        print("numba is not installed; timing the NumPy path only")
+    print("thresholds: SMALL_THRESHOLD=%d PARALLEL_THRESHOLD=%d" %
+          (_kernels.SMALL_THRESHOLD, _kernels.PARALLEL_THRESHOLD))
+    run(sizes, args.epsilon, args.weighted, np.float32 if args.float32 else np.float64)
+
+
+if __name__ == "__main__":
+    main()
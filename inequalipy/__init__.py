@@ -1,3 +1,4 @@
 from inequalipy.gini import index as gini
-__all__ = ['atkinson','kolmpollak','gini']
+from inequalipy.distribution import Distribution
+__all__ = ['atkinson','kolmpollak','gini','Distribution']
 from inequalipy import *
@@ -0,0 +1,87 @@
+"""
+Optional compiled kernels used by the inequality functions.
+numba is imported, and the kernels in `inequalipy._numba_kernels` compiled or
+loaded from the cache, on the first access to `HAVE_NUMBA` or to a kernel, so
+that importing inequalipy does not pay for it. If numba is not installed,
+`HAVE_NUMBA` is False and the kernels are None; callers then fall back to
+their pure NumPy implementations.
+"""
+
+_KERNELS = ('gini_sorted', 'gini_weighted', 'kp_sum_exp', 'kp_sum_exp_serial',
+            'kp_moments', 'kp_moments_serial', 'kp_ede', 'kp_ede_serial', 'kp_ede_batch')
+
+# Up to SMALL_THRESHOLD values a single-threaded compiled call beats the
+# several NumPy calls it replaces, whose per-call overhead dominates. Between
+# the two thresholds NumPy's vectorised exp is faster than a compiled scalar
+# loop, and above PARALLEL_THRESHOLD the multi-threaded kernels pay off again,
+# provided numba has more than one thread to run them on. A sum of
+# exponentials alone replaces fewer NumPy calls than the fused EDE kernels, so
+# its compiled loop falls behind from SMALL_EXP_THRESHOLD values.
+SMALL_THRESHOLD = 1200
+SMALL_EXP_THRESHOLD = 500
+PARALLEL_THRESHOLD = 10000
+
+# Below this |kappa| times the standard deviation of the values, exp and log
+# would cancel most of the digits by which the EDE differs from the mean, so
+# the shifted exponentials are accumulated minus one with expm1 and recovered
+# with log1p instead.
+EXPM1_THRESHOLD = 1e-2
+
+def use_kernels(a, small_threshold = None):
+    """
+    Whether the compiled kernels should be used for the array `a`, with the
+    single-threaded ones up to `small_threshold` values (`SMALL_THRESHOLD`
+    if None).
+    """
+    if a.size > PARALLEL_THRESHOLD:
+        # On a single thread the threaded kernels are slower than NumPy
+        return _load() and _num_threads() > 1
+    if small_threshold is None:
+        small_threshold = SMALL_THRESHOLD
+    return 0 < a.size <= small_threshold and _load()
+
+
+def _num_threads():
+    """
+    The number of threads numba currently runs parallel kernels on, which
+    `NUMBA_NUM_THREADS` or `numba.set_num_threads` may limit.
+    """
+    from inequalipy import _numba_kernels
+    return _numba_kernels.get_num_threads()
+
+
+def serial(a):
+    """
+    Whether the single-threaded kernels should be used for the array `a`,
+    when `use_kernels(a)` is True; starting the threads costs more than
+    small arrays take to process.
+    """
+    return a.size <= SMALL_THRESHOLD
+
+
+def _load():
+    """
+    Import numba and the kernels on first use and return `HAVE_NUMBA`.
+    Setting `HAVE_NUMBA = False` beforehand disables the kernels without
+    importing numba.
+    """
+    g = globals()
+    if 'HAVE_NUMBA' not in g:
+        try:
+            from inequalipy import _numba_kernels
+        except ImportError:
+            g['HAVE_NUMBA'] = False
+        else:
+            for name in _KERNELS:
+                g[name] = getattr(_numba_kernels, name)
+            g['HAVE_NUMBA'] = True
+    return g['HAVE_NUMBA']
+
+
+def __getattr__(name):
+    if name == 'HAVE_NUMBA':
+        return _load()
+    if name in _KERNELS:
+        _load()
+        return globals().get(name)
+    raise AttributeError("module %r has no attribute %r" % (__name__, name))
@@ -0,0 +1,207 @@
+"""
+The numba kernels behind `inequalipy._kernels`. This module imports numba, so
+it is only imported on the first call that can use a kernel.
+"""
+import math
+import numpy as np
+from numba import njit, prange, get_num_threads
+
+# Fast-math flags that still honour NaN and inf, so that, together with
+# error_model='numpy', the kernels return nan where the NumPy code does instead
+# of raising ZeroDivisionError. Defined here rather than in `_kernels`, as
+# numba's on-disk cache only notices changes to this file.
+_FASTMATH = {'reassoc', 'contract', 'arcp'}
+
+
+@njit(cache=True, inline='always')
+def _exp(z, minus_one):
+    return math.expm1(z) if minus_one else math.exp(z)
+
+
+@njit(cache=True, inline='always')
+def _log(x, minus_one):
+    return math.log1p(x) if minus_one else math.log(x)
+
+
+@njit(cache=True, inline='always')
+def _kp_shift(kappa, x_sum, x_sq_sum, w_sum, x_min, x_max, expm1_threshold):
+    """
+    The exponent shift and whether to accumulate with expm1, as in
+    `kolmpollak.ede`. The threshold is passed in rather than read as a
+    global from `_kernels`, which the cache would not track.
+    """
+    mean = x_sum / w_sum
+    spread = abs(kappa) * math.sqrt(abs(x_sq_sum / w_sum - mean * mean))
+    return x_min if kappa > 0 else x_max, spread < expm1_threshold
+
+
+@njit(cache=True, inline='always')
+def _kp_ede_from_sum(total, w_sum, kappa, shift, minus_one, mean):
+    """
+    The EDE from the (weighted) sum of the shifted exponentials, as in
+    `kolmpollak.ede`.
+    """
+    if minus_one and total == 0.0:
+        # Every exponent rounded to zero, as when kappa == 0
+        return mean
+    return shift - _log(total / w_sum, minus_one) / kappa
+
+
+@njit(cache=True, error_model='numpy', fastmath=_FASTMATH)
+def gini_sorted(sorted_x):
+    """
+    Gini Coefficient of an ascending 1-D array, accumulating the running
+    total and the sum of the running totals in a single loop.
+    """
+    n = sorted_x.shape[0]
+    cumx = 0.0
+    cumx_sum = 0.0
+    for i in range(n):
+        cumx += sorted_x[i]
+        cumx_sum += cumx
+    return (n + 1 - 2 * cumx_sum / cumx) / n
+
+
+@njit(cache=True, error_model='numpy', fastmath=_FASTMATH)
+def gini_weighted(sorted_x, sorted_w):
+    """
+    Weighted Gini Coefficient of an ascending 1-D array, without
+    materialising the cumulative weight and cumulative value arrays.
+    """
+    cumw = 0.0
+    cumxw = 0.0
+    num = 0.0
+    for i in range(sorted_x.shape[0]):
+        next_cumw = cumw + sorted_w[i]
+        next_cumxw = cumxw + sorted_x[i] * sorted_w[i]
+        num += next_cumxw * cumw - cumxw * next_cumw
+        cumw = next_cumw
+        cumxw = next_cumxw
+    return num / (cumxw * cumw)
+
+
+# The Kolm-Pollak kernels take `weights=None` for unweighted data; numba
+# compiles a separate specialisation with the weighted branches removed.
+
+@njit(cache=True, error_model='numpy', fastmath=_FASTMATH, parallel=True)
+def kp_sum_exp(a, kappa, shift, weights, minus_one):
+    """
+    (Weighted) sum of exp(-kappa * (a - shift)) in a single multi-threaded
+    pass, or of exp(...) - 1 if `minus_one`.
+    """
+    total = 0.0
+    for i in prange(a.shape[0]):
+        if weights is None:
+            total += _exp(kappa * (shift - a[i]), minus_one)
+        else:
+            total += _exp(kappa * (shift - a[i]), minus_one) * weights[i]
+    return total
+
+
+@njit(cache=True, error_model='numpy', fastmath=_FASTMATH)
+def kp_sum_exp_serial(a, kappa, shift, weights, minus_one):
+    """
+    Single-threaded `kp_sum_exp`, for arrays too small to pay for starting
+    the threads.
+    """
+    total = 0.0
+    for i in range(a.shape[0]):
+        if weights is None:
+            total += _exp(kappa * (shift - a[i]), minus_one)
+        else:
+            total += _exp(kappa * (shift - a[i]), minus_one) * weights[i]
+    return total
+
+
+@njit(cache=True, error_model='numpy', fastmath=_FASTMATH, parallel=True)
+def kp_moments(a, weights):
+    """
+    (Weighted) sum, sum of squares, total weight and extremes of `a` in a
+    single multi-threaded pass.
+    """
+    w_sum = 0.0
+    x_sum = 0.0
+    x_sq_sum = 0.0
+    x_min = a[0]
+    x_max = a[0]
+    for i in prange(a.shape[0]):
+        if weights is None:
+            w_sum += 1.0
+            x_sum += a[i]
+            x_sq_sum += a[i] * a[i]
+        else:
+            xw = a[i] * weights[i]
+            w_sum += weights[i]
+            x_sum += xw
+            x_sq_sum += xw * a[i]
+        x_min = min(x_min, a[i])
+        x_max = max(x_max, a[i])
+    return x_sum, x_sq_sum, w_sum, x_min, x_max
+
+
+@njit(cache=True, error_model='numpy', fastmath=_FASTMATH)
+def kp_moments_serial(a, weights):
+    """
+    Single-threaded `kp_moments`.
+    """
+    w_sum = 0.0
+    x_sum = 0.0
+    x_sq_sum = 0.0
+    x_min = a[0]
+    x_max = a[0]
+    for i in range(a.shape[0]):
+        if weights is None:
+            w_sum += 1.0
+            x_sum += a[i]
+            x_sq_sum += a[i] * a[i]
+        else:
+            xw = a[i] * weights[i]
+            w_sum += weights[i]
+            x_sum += xw
+            x_sq_sum += xw * a[i]
+        x_min = min(x_min, a[i])
+        x_max = max(x_max, a[i])
+    return x_sum, x_sq_sum, w_sum, x_min, x_max
+
+
+@njit(cache=True, error_model='numpy', fastmath=_FASTMATH)
+def kp_ede(a, epsilon, weights, expm1_threshold):
+    """
+    Kolm-Pollak EDE and mean from the Atkinson aversion parameter, in two
+    multi-threaded passes. The first gathers the sums for kappa and the mean
+    and the extremes for the exponent shift, the second accumulates the
+    shifted exponentials.
+    """
+    x_sum, x_sq_sum, w_sum, x_min, x_max = kp_moments(a, weights)
+    kappa = epsilon * (x_sum / x_sq_sum)
+    shift, minus_one = _kp_shift(kappa, x_sum, x_sq_sum, w_sum, x_min, x_max, expm1_threshold)
+    total = kp_sum_exp(a, kappa, shift, weights, minus_one)
+    return _kp_ede_from_sum(total, w_sum, kappa, shift, minus_one, x_sum / w_sum), x_sum / w_sum
+
+
+@njit(cache=True, error_model='numpy', fastmath=_FASTMATH)
+def kp_ede_serial(a, epsilon, weights, expm1_threshold):
+    """
+    Single-threaded `kp_ede`, used for small arrays and for each row in
+    `kp_ede_batch`.
+    """
+    x_sum, x_sq_sum, w_sum, x_min, x_max = kp_moments_serial(a, weights)
+    kappa = epsilon * (x_sum / x_sq_sum)
+    shift, minus_one = _kp_shift(kappa, x_sum, x_sq_sum, w_sum, x_min, x_max, expm1_threshold)
+    total = kp_sum_exp_serial(a, kappa, shift, weights, minus_one)
+    return _kp_ede_from_sum(total, w_sum, kappa, shift, minus_one, x_sum / w_sum), x_sum / w_sum
+
+
+@njit(cache=True, error_model='numpy', fastmath=_FASTMATH, parallel=True)
+def kp_ede_batch(A, epsilon, weights, expm1_threshold):
+    """
+    Kolm-Pollak EDE of each row of the 2-D array `A`, with the rows
+    spread across threads.
+    """
+    out = np.empty(A.shape[0])
+    for m in prange(A.shape[0]):
+        if weights is None:
+            out[m] = kp_ede_serial(A[m], epsilon, None, expm1_threshold)[0]
+        else:
+            out[m] = kp_ede_serial(A[m], epsilon, weights[m], expm1_threshold)[0]
+    return out
@@ -1,6 +1,8 @@
 import numpy as np
+from inequalipy.distribution import _as_distribution
 
-def ede(a, epsilon = 0.5, weights = None):
+# Memory-bound: one power pass and one reduction over the data.
+def ede(a, epsilon = 0.5, weights = None, dtype = np.float64):
     """
     Compute the Atkinson Equally-Distributed Equivalent.
     The Atkinson EDE and Index are only suitable for distributions of desirable
@@ -8,8 +10,9 @@ def ede(a, epsilon = 0.5, weights = None):
 
     Parameters
     ----------
-    a : array_like
-        1-D array containing the values of the distribution.
+    a : array_like or Distribution
+        1-D array containing the values of the distribution, or a Distribution
+        prepared from them (in which case the weights are taken from it).
     epsilon : float
         The inequality aversion parameter. epsilon > 0.
     weights : array_like, optional
@@ -17,30 +20,29 @@ def ede(a, epsilon = 0.5, weights = None):
         `a` contributes to the average according to its associated weight.
         If `weights=None`, then all data in `a` are assumed to have a
         weight equal to one.
+    dtype : data-type, optional
+        Floating-point type the values are stored and processed in. Passing
+        `np.float32` halves the memory traffic on large distributions at a
+        relative error of around 1e-6; sums are still accumulated in float64.
+        Ignored if `a` is a Distribution.
 
     Returns
     -------
     value : float
         Returns the Atkinson EDE of the distribution provided.
     """
-    sum_atk = 0
-    if not weights:
-        N = len(a)
+    dist = _as_distribution(a, weights, dtype)
+    p = _power(dist.a, 1 - epsilon)
+    if dist.weights is None:
+        sum_atk = p.sum(dtype=np.float64)
     else:
-        N = weights.sum()
-    x_mean = np.average(a, weights = weights)
-    count = 0
-    for i in a:
-        if not weights:
-            sum_atk += i**(1 - epsilon)
-        else:
-            sum_atk += (i**(1 - epsilon)) * weights[count]
-        count += 1
-    ede = (sum_atk / N)**(1 / (1 - epsilon))
+        sum_atk = np.einsum('i,i->', p, dist.weights, dtype=np.float64)
+    ede = (sum_atk / dist.total_weight)**(1 / (1 - epsilon))
     return(ede)
 
 
-def index(a, epsilon = 0.5, weights = None):
+# Memory-bound, as ede; the mean is the cached Distribution total.
+def index(a, epsilon = 0.5, weights = None, dtype = np.float64):
     """
     Compute the Atkinson Index.
     The Atkinson EDE and Index are only suitable for distributions of desirable
@@ -48,8 +50,9 @@ def index(a, epsilon = 0.5, weights = None):
 
     Parameters
     ----------
-    a : array_like
-        1-D array containing the values of the distribution.
+    a : array_like or Distribution
+        1-D array containing the values of the distribution, or a Distribution
+        prepared from them (in which case the weights are taken from it).
     epsilon : float
         The inequality aversion parameter. epsilon > 0.
     weights : array_like, optional
@@ -57,13 +60,35 @@ def index(a, epsilon = 0.5, weights = None):
         `a` contributes to the average according to its associated weight.
         If `weights=None`, then all data in `a` are assumed to have a
         weight equal to one.
+    dtype : data-type, optional
+        Floating-point type the values are stored and processed in. Passing
+        `np.float32` halves the memory traffic on large distributions at a
+        relative error of around 1e-6; sums are still accumulated in float64.
+        Ignored if `a` is a Distribution.
 
     Returns
     -------
     value : float
         Returns the Atkinson Index of the distribution provided.
     """
-    ede_atk = ede(a, epsilon, weights)
-    x_mean = np.average(a, weights = weights)
+    dist = _as_distribution(a, weights, dtype)
+    ede_atk = ede(dist, epsilon)
 
-    return(1 - (ede_atk / x_mean))
+    return(1 - (ede_atk / dist.mean))
+
+
+def _power(a, exponent):
+    """
+    Raise `a` to `exponent`, using NumPy's specialised ufuncs for the common
+    exponents instead of the generic `np.power` loop.
+    """
+    if exponent == 0.5:
+        return np.sqrt(a)
+    elif exponent == 2:
+        return np.square(a)
+    elif exponent == -1:
+        return np.reciprocal(a)
+    elif exponent == 1.5:
+        return a * np.sqrt(a)
+    else:
+        return np.power(a, exponent)
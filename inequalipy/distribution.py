@@ -0,0 +1,138 @@
+import numpy as np
+
+class Distribution:
+    """
+    A distribution prepared for computing several inequality measures.
+    The sorted values, total weight and mean are computed on first use and
+    cached, so passing the same Distribution to `gini`, `atkinson` and
+    `kolmpollak` functions sorts and reduces the data only once.
+    Contiguous input of the requested dtype is used without copying, so the
+    arrays passed in must not be modified while the Distribution is in use;
+    the cached results would no longer match the data.
+
+    Parameters
+    ----------
+    a : array_like
+        1-D array containing the values of the distribution.
+    weights : array_like, optional
+        1-D array of integer weights associated with the values in `a`. Each value in
+        `a` contributes to the average according to its associated weight.
+        If `weights=None`, then all data in `a` are assumed to have a
+        weight equal to one.
+    dtype : data-type, optional
+        Floating-point type the values and weights are stored in. Inputs of a
+        different type, or that are not contiguous in memory, are copied.
+    """
+    __slots__ = ('a', 'weights', '_sorted_a', '_sorted_weights', '_total_weight', '_total',
+                 '_min', '_max')
+
+    def __init__(self, a, weights = None, dtype = np.float64):
+        # Contiguous arrays keep NumPy and numba on their vectorised loops
+        self.a = np.ascontiguousarray(a, dtype=dtype)
+        if self.a.ndim != 1:
+            raise ValueError("a must be 1-D")
+        self.weights = None if weights is None else np.ascontiguousarray(weights, dtype=dtype)
+        if self.weights is not None and self.weights.shape != self.a.shape:
+            raise ValueError("weights must have the same shape as a")
+        self._sorted_a = None
+        self._sorted_weights = None
+        self._total_weight = None
+        self._total = None
+        self._min = None
+        self._max = None
+
+    def __len__(self):
+        return self.a.size
+
+    def _sort(self):
+        if self.weights is None:
+            self._sorted_a = np.sort(self.a)
+        elif np.all(self.a[1:] >= self.a[:-1]):
+            # Already ascending: skip the argsort and the two gathers
+            self._sorted_a = self.a
+            self._sorted_weights = self.weights
+        else:
+            sorted_indices = np.argsort(self.a)
+            self._sorted_a = self.a[sorted_indices]
+            self._sorted_weights = self.weights[sorted_indices]
+
+    @property
+    def sorted_a(self):
+        """The values of the distribution in ascending order."""
+        if self._sorted_a is None:
+            self._sort()
+        return self._sorted_a
+
+    @property
+    def sorted_weights(self):
+        """The weights ordered to match `sorted_a`, or None if unweighted."""
+        if self.weights is not None and self._sorted_weights is None:
+            self._sort()
+        return self._sorted_weights
+
+    @property
+    def total_weight(self):
+        """The sum of the weights (the number of values if unweighted)."""
+        if self._total_weight is None:
+            if self.weights is None:
+                self._total_weight = self.a.size
+            else:
+                self._total_weight = float(np.sum(self.weights, dtype=np.float64))
+        return self._total_weight
+
+    @property
+    def total(self):
+        """The (weighted) sum of the values."""
+        if self._total is None:
+            if self.weights is None:
+                self._total = float(self.a.sum(dtype=np.float64))
+            else:
+                self._total = float(np.einsum('i,i->', self.a, self.weights, dtype=np.float64))
+        return self._total
+
+    @property
+    def min(self):
+        """The smallest value."""
+        if self._min is None:
+            if self._sorted_a is not None:
+                self._min = self._sorted_a[0]
+            else:
+                self._min = self.a.min()
+        return self._min
+
+    @property
+    def max(self):
+        """The largest value."""
+        if self._max is None:
+            if self._sorted_a is not None:
+                self._max = self._sorted_a[-1]
+            else:
+                self._max = self.a.max()
+        return self._max
+
+    @property
+    def mean(self):
+        """The (weighted) mean of the values."""
+        return self.total / self.total_weight
+
+
+def _dot(x, y):
+    """
+    The sum of `x * y`, accumulated in float64. float64 arrays use the BLAS
+    dot product, which is several times faster than einsum.
+    """
+    if x.dtype == np.float64 and y.dtype == np.float64:
+        return float(x.dot(y))
+    return float(np.einsum('i,i->', x, y, dtype=np.float64))
+
+
+def _as_distribution(a, weights = None, dtype = np.float64):
+    """
+    Return `a` unchanged if it is already a Distribution, otherwise wrap `a`
+    and `weights` in a new Distribution of the given `dtype`.
+    """
+    if isinstance(a, Distribution):
+        if weights is not None:
+            raise TypeError("weights must be given when constructing the Distribution, not alongside it")
+        return a
+    return Distribution(a, weights, dtype)
@@ -1,39 +1,58 @@
 import numpy as np
+from inequalipy import _kernels
+from inequalipy.distribution import _as_distribution
 
-def index(a, weights = None):
+# Sort-bound: the O(N log N) sort dominates the single cumulative pass after it.
+def index(a, weights = None, dtype = np.float64):
     """
     Compute the Gini Coefficient.
     Thanks Gaëtan de Menten: https://stackoverflow.com/a/49571213/5890574
 
     Parameters
     ----------
-    a : array_like
-        1-D array containing the values of the distribution.
+    a : array_like or Distribution
+        1-D array containing the values of the distribution, or a Distribution
+        prepared from them (in which case the weights are taken from it).
     weights : array_like, optional
         1-D array of integer weights associated with the values in `a`. Each value in
         `a` contributes to the average according to its associated weight.
         If `weights=None`, then all data in `a` are assumed to have a
         weight equal to one.
+    dtype : data-type, optional
+        Floating-point type the values are stored and processed in. Passing
+        `np.float32` halves the memory traffic on large distributions at a
+        relative error of around 1e-6; sums are still accumulated in float64.
+        Ignored if `a` is a Distribution.
 
     Returns
     -------
     gini : float
         Returns the Gini Coefficient of the distribution provided.
     """
-    a = np.asarray(a)
-    if weights is not None:
-        weights = np.asarray(weights)
-        sorted_indices = np.argsort(a)
-        sorted_x = a[sorted_indices]
-        sorted_w = weights[sorted_indices]
+    dist = _as_distribution(a, weights, dtype)
+    if dist.a.size == 0:
+        return np.nan
+    if dist.weights is not None:
+        sorted_x = dist.sorted_a
+        sorted_w = dist.sorted_weights
+        if _kernels.HAVE_NUMBA:
+            return _kernels.gini_weighted(sorted_x, sorted_w)
         # Force float dtype to avoid overflows
         cumw = np.cumsum(sorted_w, dtype=float)
-        cumxw = np.cumsum(sorted_x * sorted_w, dtype=float)
-        return (np.sum(cumxw[1:] * cumw[:-1] - cumxw[:-1] * cumw[1:]) /
-                (cumxw[-1] * cumw[-1]))
+        total_w = cumw[-1]
+        xw = sorted_x * sorted_w
+        # sum(cumxw[1:] * cumw[:-1] - cumxw[:-1] * cumw[1:]) telescopes to
+        # sum(x * w * (2 * cumw - w - W)), which needs no cumsum of x * w
+        np.multiply(cumw, 2, out=cumw)
+        cumw -= sorted_w
+        cumw -= total_w
+        return (np.einsum('i,i->', xw, cumw) /
+                (xw.sum(dtype=float) * total_w))
     else:
-        sorted_x = np.sort(a)
-        n = len(a)
+        sorted_x = dist.sorted_a
+        if _kernels.HAVE_NUMBA:
+            return _kernels.gini_sorted(sorted_x)
+        n = len(sorted_x)
         cumx = np.cumsum(sorted_x, dtype=float)
         # The above formula, with all weights equal to 1 simplifies to:
         return (n + 1 - 2 * np.sum(cumx) / cumx[-1]) / n
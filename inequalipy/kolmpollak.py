@@ -1,6 +1,22 @@
+import threading
 import numpy as np
+from inequalipy import _kernels
+from inequalipy.distribution import _as_distribution, _dot
 
-def ede(a, epsilon = None, kappa = None, weights = None):
+# Arrays larger than _BLOCK_THRESHOLD are exponentiated in blocks of
+# _BLOCK_SIZE values so the scratch buffer stays in cache.
+_BLOCK_SIZE = 65536
+_BLOCK_THRESHOLD = 1000000
+
+# Per-thread scratch buffer reused by consecutive calls on same-sized data
+_scratch = threading.local()
+
+# Cache for _exp_limit, keyed by dtype
+_exp_limits = {}
+
+# Small N: call-overhead and exp-latency bound, so use the compiled kernels.
+# Large N: memory-bound, so fuse and block the passes rather than speed up exp.
+def ede(a, epsilon = None, kappa = None, weights = None, dtype = np.float64, out = None):
     """
     Compute the Kolm-Pollak Equally-Distributed Equivalent (EDE).
     The Kolm-Pollak EDE and Index are suitable for distributions of desirable and
@@ -10,8 +26,9 @@ def ede(a, epsilon = None, kappa = None, weights = None):
 
     Parameters
     ----------
-    a : array_like
-        1-D array containing the values of the distribution.
+    a : array_like or Distribution
+        1-D array containing the values of the distribution, or a Distribution
+        prepared from them (in which case the weights are taken from it).
     epsilon : float
         The inequality aversion parameter from the Atkinson formulae.
             If epsilon > 0 then the quantity is desirable (more is better).
@@ -23,27 +40,69 @@ def ede(a, epsilon = None, kappa = None, weights = None):
         `a` contributes to the average according to its associated weight.
         If `weights=None`, then all data in `a` are assumed to have a
         weight equal to one.
+    dtype : data-type, optional
+        Floating-point type the values are stored and processed in. Passing
+        `np.float32` halves the memory traffic on large distributions at a
+        relative error of around 1e-6; sums are still accumulated in float64.
+        Ignored if `a` is a Distribution.
+    out : ndarray, optional
+        Scratch array with the same shape as `a` used to hold the intermediate
+        exponentials; its contents are overwritten. If not given, a buffer
+        kept between calls on the current thread is used instead (see
+        `clear_scratch`). Left untouched when the numba kernels are used.
 
     Returns
     -------
     value : float
         Returns the Kolm-Pollak Equally-Distributed Equivalent of the distribution provided.
     """
-    a = np.asanyarray(a)
+    dist = _as_distribution(a, weights, dtype)
     if kappa is None:
         if epsilon is None:
             raise TypeError("you must provide either a epsilon or kappa aversion parameter")
-        kappa = calc_kappa(a, epsilon, weights)
-    if weights is None:
-        ede_sum = np.exp(a*-kappa).sum()
-        N = len(a)
+        if _kernels.use_kernels(dist.a):
+            return _fused_ede(dist, epsilon)[0]
+    if dist.a.size == 0:
+        return np.nan
+    x_sq_sum = _sq_sum(dist)
+    if kappa is None:
+        kappa = epsilon * (np.float64(dist.total) / x_sq_sum)
+    # A Python float scalar keeps float32 data on the float32 ufunc loops
+    kappa = float(kappa)
+    total_weight = dist.total_weight
+    if _use_expm1(kappa, dist.mean, x_sq_sum, total_weight):
+        # Shifted by the value with the largest exponent, the terms share a
+        # sign and do not cancel
+        shift = dist.min if kappa > 0 else dist.max
+        ede_sum = _sum_exp(dist.a, kappa, dist.weights, shift, out, minus_one = True)
+        if ede_sum == 0:
+            # Every exponent rounded to zero, as when kappa == 0
+            return dist.mean
+        return shift - np.log1p(ede_sum / total_weight) / kappa
+    # Unshifted, exp(-kappa * a) saves the pass that finds the extreme. No
+    # unweighted value exceeds the square root of the sum of squares, so below
+    # the limit no term can overflow; otherwise, keep the sum only if the mean
+    # term, exp(-kappa * ede), is well within range.
+    limit = _exp_limit(dist.a.dtype)
+    if dist.weights is None and abs(kappa) * x_sq_sum ** 0.5 < limit:
+        ede_sum = _sum_exp(dist.a, kappa, dist.weights, 0, out)
     else:
-        ede_sum = np.multiply(np.exp(a*-kappa), weights).sum()
-        N = weights.sum()
-    return(-1 / kappa) * np.log(ede_sum / N)
+        with np.errstate(over='ignore', invalid='ignore'):
+            ede_sum = _sum_exp(dist.a, kappa, dist.weights, 0, out)
+    if 0 < ede_sum < np.inf:
+        ede_kp = -np.log(ede_sum / total_weight) / kappa
+        if abs(kappa * ede_kp) < limit:
+            return ede_kp
+    # Shift by the value with the largest exponent (log-sum-exp) so that exp()
+    # can neither overflow nor underflow every term to zero
+    shift = dist.min if kappa > 0 else dist.max
+    ede_sum = _sum_exp(dist.a, kappa, dist.weights, shift, out)
+    return shift - np.log(ede_sum / total_weight) / kappa
 
 
-def index(a, epsilon = None, kappa = None, weights = None):
+# Costs one ede call: the mean is the sum behind kappa, which the expm1 test
+# needs even when kappa is given.
+def index(a, epsilon = None, kappa = None, weights = None, dtype = np.float64):
     """
     Compute the Kolm-Pollak Index.
     The Kolm-Pollak EDE and Index are suitable for distributions of desirable and
@@ -53,8 +112,9 @@ def index(a, epsilon = None, kappa = None, weights = None):
 
     Parameters
     ----------
-    a : array_like
-        1-D array containing the values of the distribution.
+    a : array_like or Distribution
+        1-D array containing the values of the distribution, or a Distribution
+        prepared from them (in which case the weights are taken from it).
     epsilon : float
         The inequality aversion parameter from the Atkinson formulae.
             If epsilon > 0 then the quantity is desirable (more is better).
@@ -66,21 +126,73 @@ def index(a, epsilon = None, kappa = None, weights = None):
         `a` contributes to the average according to its associated weight.
         If `weights=None`, then all data in `a` are assumed to have a
         weight equal to one.
+    dtype : data-type, optional
+        Floating-point type the values are stored and processed in. Passing
+        `np.float32` halves the memory traffic on large distributions at a
+        relative error of around 1e-6; sums are still accumulated in float64.
+        Ignored if `a` is a Distribution.
 
     Returns
     -------
     value : float
         Returns the Kolm-Pollak Index of the distribution provided.
     """
-    if weights is None:
-        x_mean = np.mean(a)
+    return ede_and_index(a, epsilon = epsilon, kappa = kappa, weights = weights, dtype = dtype)[1]
+
+
+# Both results from one EDE computation; the index only subtracts the mean.
+def ede_and_index(a, epsilon = None, kappa = None, weights = None, dtype = np.float64):
+    """
+    Compute both the Kolm-Pollak EDE and Index.
+    This shares the mean, kappa and the exponential sum between the two, so it
+    is cheaper than calling `ede` and `index` separately.
+    The Kolm-Pollak EDE and Index are suitable for distributions of desirable and
+    undesirable quantities. That is, a desirable quantity (like income) is where
+    having more of the quantity is desirable; compared with an undesirable
+    quantity like health risk, where less is better.
+
+    Parameters
+    ----------
+    a : array_like or Distribution
+        1-D array containing the values of the distribution, or a Distribution
+        prepared from them (in which case the weights are taken from it).
+    epsilon : float
+        The inequality aversion parameter from the Atkinson formulae.
+            If epsilon > 0 then the quantity is desirable (more is better).
+    kappa : float
+        The inequality aversion parameter from the Kolm-Pollak formulae.
+            If kappa > 0 then the quantity is desirable (more is better).
+    weights : array_like, optional
+        1-D array of integer weights associated with the values in `a`. Each value in
+        `a` contributes to the average according to its associated weight.
+        If `weights=None`, then all data in `a` are assumed to have a
+        weight equal to one.
+    dtype : data-type, optional
+        Floating-point type the values are stored and processed in. Passing
+        `np.float32` halves the memory traffic on large distributions at a
+        relative error of around 1e-6; sums are still accumulated in float64.
+        Ignored if `a` is a Distribution.
+
+    Returns
+    -------
+    value : tuple of float
+        Returns the Kolm-Pollak EDE and Index of the distribution provided.
+    """
+    dist = _as_distribution(a, weights, dtype)
+    if dist.a.size == 0:
+        return np.nan, np.nan
+    if kappa is None and epsilon is not None and _kernels.use_kernels(dist.a):
+        ede_kp, x_mean = _fused_ede(dist, epsilon)
     else:
-        x_mean = np.average(a, weights = weights)
+        ede_kp = ede(dist, epsilon = epsilon, kappa = kappa)
+        x_mean = dist.mean
 
-    return ede(a, epsilon = epsilon, kappa = kappa, weights = weights) - x_mean
+    return ede_kp, ede_kp - x_mean
 
 
-def calc_kappa(a, epsilon, weights = None):
+# Memory-bound: one fused pass in the kernels, a sum and a BLAS dot product
+# with NumPy (plus a weighted copy of the values when weighted).
+def calc_kappa(a, epsilon, weights = None, dtype = np.float64):
     """
     Converts the inequality aversion parameter used in Atkinson's formulae (epsilon)
     into the form for the Kolm-Pollak formulae (kappa).
@@ -88,8 +200,9 @@ def calc_kappa(a, epsilon, weights = None):
 
     Parameters
     ----------
-    a : array_like
-        1-D array containing the values of the distribution.
+    a : array_like or Distribution
+        1-D array containing the values of the distribution, or a Distribution
+        prepared from them (in which case the weights are taken from it).
     epsilon : float
         The inequality aversion parameter from the Atkinson formulae.
             If epsilon > 0 then the quantity is desirable (more is better).
@@ -98,16 +211,222 @@ def calc_kappa(a, epsilon, weights = None):
         `a` contributes to the average according to its associated weight.
         If `weights=None`, then all data in `a` are assumed to have a
         weight equal to one.
+    dtype : data-type, optional
+        Floating-point type the values are stored and processed in. Passing
+        `np.float32` halves the memory traffic on large distributions at a
+        relative error of around 1e-6; sums are still accumulated in float64.
+        Ignored if `a` is a Distribution.
 
     Returns
     -------
     value : float
         Returns the inequality aversion parameter for the Kolm-Pollak formulae
     """
+    dist = _as_distribution(a, weights, dtype)
+    a = dist.a
+    if _kernels.use_kernels(a):
+        moments = _kernels.kp_moments_serial if _kernels.serial(a) else _kernels.kp_moments
+        x_sum, x_sq_sum = moments(a, dist.weights)[:2]
+    else:
+        x_sum = dist.total
+        x_sq_sum = _sq_sum(dist)
+    # As NumPy scalars, all-zero data gives nan rather than ZeroDivisionError
+    return(epsilon * (np.float64(x_sum) / x_sq_sum))
+
+
+# As ede per row; rows are independent, so the kernels parallelise across them.
+def ede_batch(A, epsilon = None, kappa = None, weights = None, axis = 1, dtype = np.float64):
+    """
+    Compute the Kolm-Pollak Equally-Distributed Equivalent (EDE) of many
+    distributions of the same size at once, e.g., one per region or year.
+    Equivalent to calling `ede` on each distribution, without the per-call
+    overhead of a Python loop.
+
+    Parameters
+    ----------
+    A : array_like
+        2-D array of distributions. Each row (or column, if `axis=0`) holds the
+        values of one distribution.
+    epsilon : float
+        The inequality aversion parameter from the Atkinson formulae.
+            If epsilon > 0 then the quantity is desirable (more is better).
+            kappa is derived separately for each distribution.
+    kappa : float or array_like
+        The inequality aversion parameter from the Kolm-Pollak formulae, either
+        shared by all distributions or one per distribution.
+            If kappa > 0 then the quantity is desirable (more is better).
+    weights : array_like, optional
+        Array of integer weights with the same shape as `A`, or 1-D array of
+        integer weights with one weight per value, shared by all the
+        distributions. Each value in `A` contributes to the average according
+        to its associated weight.
+        If `weights=None`, then all data in `A` are assumed to have a
+        weight equal to one.
+    axis : int, optional
+        The axis of `A` along which the values of each distribution lie:
+        1 or -1 for rows, 0 or -2 for columns.
+    dtype : data-type, optional
+        Floating-point type the values are stored and processed in.
+
+    Returns
+    -------
+    value : ndarray
+        1-D array with the Kolm-Pollak EDE of each distribution.
+    """
+    A = np.asarray(A, dtype=dtype)
+    if A.ndim != 2:
+        raise ValueError("A must be a 2-D array of distributions")
+    if axis not in (-2, -1, 0, 1):
+        raise ValueError("axis %r is out of bounds for a 2-D array" % (axis,))
+    axis %= 2
+    if axis == 0:
+        A = A.T
+    A = np.ascontiguousarray(A)
+    if weights is not None:
+        weights = np.asarray(weights, dtype=dtype)
+        if axis == 0 and weights.ndim == 2:
+            weights = weights.T
+        # Broadcast in the row layout, so that 1-D weights are per value
+        weights = np.ascontiguousarray(np.broadcast_to(weights, A.shape))
+    if kappa is None and epsilon is None:
+        raise TypeError("you must provide either a epsilon or kappa aversion parameter")
+    if A.shape[1] == 0:
+        return np.full(A.shape[0], np.nan)
+    if kappa is None and _kernels.HAVE_NUMBA and A.size > 0:
+        return _kernels.kp_ede_batch(A, epsilon, weights, _kernels.EXPM1_THRESHOLD)
+    if weights is None:
+        N = A.shape[1]
+        x_sum = A.sum(axis=1, dtype=np.float64)
+    else:
+        N = weights.sum(axis=1, dtype=np.float64)
+        x_sum = np.einsum('ij,ij->i', A, weights, dtype=np.float64)
+    x_mean = x_sum / N
+    if weights is None:
+        x_sq_sum = np.einsum('ij,ij->i', A, A, dtype=np.float64)
+    else:
+        x_sq_sum = np.einsum('ij,ij,ij->i', A, A, weights, dtype=np.float64)
+    if kappa is None:
+        kappa = epsilon * (x_sum / x_sq_sum)
+    kappa = np.broadcast_to(np.asarray(kappa, dtype=np.float64), A.shape[:1])
+    minus_one = _use_expm1(kappa, x_mean, x_sq_sum, N)
+    shift = np.where(kappa > 0, A.min(axis=1), A.max(axis=1))
+    buf = np.subtract(shift[:, None], A)
+    buf *= kappa[:, None]
+    np.exp(buf, out=buf, where=~minus_one[:, None])
+    np.expm1(buf, out=buf, where=minus_one[:, None])
     if weights is None:
-        x_sum = a.sum()
-        x_sq_sum = (np.array(a)**2).sum()
+        ede_sum = buf.sum(axis=1, dtype=np.float64)
     else:
-        x_sum = np.multiply(a, weights).sum()
-        x_sq_sum = np.multiply(a**2, weights).sum()
-    return(epsilon * (x_sum / x_sq_sum))
+        ede_sum = np.einsum('ij,ij->i', buf, weights, dtype=np.float64)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        ede_kp = shift - np.where(minus_one, np.log1p(ede_sum / N), np.log(ede_sum / N)) / kappa
+    # Distributions whose exponents all rounded to zero, as when kappa == 0
+    return np.where(minus_one & (ede_sum == 0), x_mean, ede_kp)
+
+
+def _use_expm1(kappa, mean, x_sq_sum, total_weight):
+    """
+    Whether to accumulate exp(...) - 1 rather than exp(...), for scalars or
+    arrays of one value per distribution. Below `EXPM1_THRESHOLD`, |kappa|
+    times the standard deviation is small enough that exp and log would
+    cancel most of the digits by which the EDE differs from the mean.
+    """
+    variance = x_sq_sum / total_weight - mean * mean
+    return abs(kappa) * abs(variance) ** 0.5 < _kernels.EXPM1_THRESHOLD
+
+
+def _sq_sum(dist):
+    """
+    The (weighted) sum of the squared values of `dist`.
+    """
+    a = dist.a
+    if dist.weights is None:
+        return _dot(a, a)
+    return _dot(a * dist.weights, a)
+
+
+def _exp_limit(dtype):
+    """
+    Half the largest exponent that exp() can take in `dtype` without
+    overflowing, cached per dtype.
+    """
+    limit = _exp_limits.get(dtype)
+    if limit is None:
+        limit = _exp_limits[dtype] = np.log(np.finfo(dtype).max) / 2
+    return limit
+
+
+def _fused_ede(dist, epsilon):
+    """
+    Compute the Kolm-Pollak EDE and the mean of `dist` with the numba kernels,
+    which derive kappa, the exponent shift and the exponential sum in two
+    passes over the data.
+    """
+    kernel = _kernels.kp_ede_serial if _kernels.serial(dist.a) else _kernels.kp_ede
+    return kernel(dist.a, epsilon, dist.weights, _kernels.EXPM1_THRESHOLD)
+
+
+def _sum_exp(a, kappa, weights = None, shift = 0, out = None, minus_one = False):
+    """
+    Compute the (weighted) sum of exp(-kappa * (a - shift)), or of
+    exp(-kappa * (a - shift)) - 1 if `minus_one`.
+    Small and large arrays use the numba kernels when available, running
+    across threads only for the large ones.
+    Otherwise, arrays larger than `_BLOCK_THRESHOLD` are processed in
+    blocks through a single reused scratch buffer, so the exponentiated array
+    is never materialised in full. Unless the caller provides the buffer
+    `out`, the scratch buffer is kept between calls on the same thread.
+    """
+    if _kernels.use_kernels(a, _kernels.SMALL_EXP_THRESHOLD):
+        kernel = _kernels.kp_sum_exp_serial if _kernels.serial(a) else _kernels.kp_sum_exp
+        return kernel(a, kappa, shift, weights, minus_one)
+    if out is not None or a.size <= _BLOCK_THRESHOLD:
+        # Exponentiate in place so at most one temporary is allocated
+        if out is None:
+            out = _get_scratch(a.shape, a.dtype)
+        if shift == 0:
+            buf = np.multiply(a, -kappa, out=out)
+        else:
+            buf = np.subtract(shift, a, out=out)
+            buf *= kappa
+        (np.expm1 if minus_one else np.exp)(buf, out=buf)
+        if weights is None:
+            return buf.sum(dtype=np.float64)
+        return np.einsum('i,i->', buf, weights, dtype=np.float64)
+    scratch = _get_scratch((_BLOCK_SIZE,), a.dtype)
+    total = 0.0
+    for start in range(0, a.size, _BLOCK_SIZE):
+        block = a[start:start + _BLOCK_SIZE]
+        buf = scratch[:block.size]
+        if shift == 0:
+            np.multiply(block, -kappa, out=buf)
+        else:
+            np.subtract(shift, block, out=buf)
+            buf *= kappa
+        (np.expm1 if minus_one else np.exp)(buf, out=buf)
+        if weights is None:
+            total += buf.sum(dtype=np.float64)
+        else:
+            total += np.einsum('i,i->', buf, weights[start:start + _BLOCK_SIZE], dtype=np.float64)
+    return total
+
+
+def _get_scratch(shape, dtype):
+    """
+    Return an uninitialised array of the given shape and dtype, reusing the
+    buffer from the previous call on this thread when it matches.
+    """
+    buf = getattr(_scratch, 'buf', None)
+    if buf is None or buf.shape != shape or buf.dtype != dtype:
+        buf = np.empty(shape, dtype=dtype)
+        _scratch.buf = buf
+    return buf
+
+
+def clear_scratch():
+    """
+    Release the scratch buffer that `ede` and `index` keep between calls on
+    the current thread, e.g., once a bootstrap or Monte Carlo loop has
+    finished with large arrays.
+    """
+    _scratch.buf = None
@@ -22,5 +22,8 @@ setuptools.setup(
     install_requires=[
         'numpy'
     ],
+    extras_require={
+        'numba': ['numba']
+    },
     python_requires='>=3',
 )